@@ -1,13 +1,18 @@
+import hashlib
+import io
 import json
 import os
+import pickle
 import shutil
 from datetime import datetime
 
 import joblib
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
-import matplotlib.pyplot as plt
+import altair as alt
 
 # --------------------
 # Page config
@@ -207,112 +212,200 @@ POWER_PATH = "power_multi_household_daily.csv"
 WEATHER_PATH = "nairobi_weather_2007_2008.csv"
 
 ARTIFACT_DIR = "artifacts"
-MODELS_PATH = f"{ARTIFACT_DIR}/models_by_meter.joblib"
-SCALERS_PATH = f"{ARTIFACT_DIR}/scalers_by_meter.joblib"
+MODELS_PATH = f"{ARTIFACT_DIR}/models_by_meter.pkl"
+SCALERS_PATH = f"{ARTIFACT_DIR}/scalers_by_meter.pkl"
 META_PATH = f"{ARTIFACT_DIR}/metadata.json"
 
 # Outputs directory (for cross-page sharing)
 OUTPUT_DIR = "outputs"
-SCORED_PATH = f"{OUTPUT_DIR}/scored_output.csv"
-REPORT_PATH = f"{OUTPUT_DIR}/inspection_report.csv"
+SCORED_PATH = f"{OUTPUT_DIR}/scored_output.parquet"
+REPORT_PATH = f"{OUTPUT_DIR}/inspection_report.parquet"
 META_OUT_PATH = f"{OUTPUT_DIR}/run_metadata.json"
 
+# Risk buckets over the 0–100 risk score: (-1, 33] Low, (33, 66] Medium, (66, 101] High
+RISK_BINS = np.array([33.0, 66.0])
+RISK_LABELS = np.array(["Low", "Medium", "High"], dtype=object)
+
 
 # --------------------
 # Helper functions
 # --------------------
-def generate_alert(row: pd.Series) -> str:
-    if row["risk_level"] in ["High", "Medium"]:
-        last_date = row["last_anomaly_date"]
-        last_date_str = last_date.date().isoformat() if pd.notna(last_date) else "N/A"
-        return (
-            f"ALERT: Meter {row['meter_id']} is {row['risk_level']} risk "
-            f"(Risk Score: {row['risk_score']}). "
-            f"Anomalous days: {int(row['total_anomalies'])}; "
-            f"Max streak: {int(row['max_streak_days'])} days; "
-            f"Last anomaly: {last_date_str}. "
-            "Recommended for inspection review."
-        )
-    return "No immediate inspection required."
+def generate_alerts(report: pd.DataFrame) -> pd.Series:
+    last_date = pd.to_datetime(report["last_anomaly_date"]).dt.strftime("%Y-%m-%d").fillna("N/A")
+    alerts = (
+        "ALERT: Meter " + report["meter_id"].astype(str)
+        + " is " + report["risk_level"].astype(str) + " risk "
+        + "(Risk Score: " + report["risk_score"].astype(str) + "). "
+        + "Anomalous days: " + report["total_anomalies"].astype(int).astype(str) + "; "
+        + "Max streak: " + report["max_streak_days"].astype(int).astype(str) + " days; "
+        + "Last anomaly: " + last_date + ". "
+        + "Recommended for inspection review."
+    )
+    return alerts.where(report["risk_level"].isin(["High", "Medium"]), "No immediate inspection required.")
 
 
 def compute_max_streak(df: pd.DataFrame, flag_col: str) -> pd.DataFrame:
-    df = df.sort_values(["meter_id", "date"]).copy()
-    df["prev_flag"] = df.groupby("meter_id")[flag_col].shift(1)
-    df["start_streak"] = (df[flag_col].eq(1) & ~df["prev_flag"].eq(1))
-    df["streak_group"] = df.groupby("meter_id")["start_streak"].cumsum()
-
-    streak_lengths = (
-        df[df[flag_col] == 1]
-        .groupby(["meter_id", "streak_group"])
-        .size()
-        .reset_index(name="streak_len")
+    df = df.sort_values(["meter_id", "date"])
+    ids = df["meter_id"].to_numpy()
+    flag = df[flag_col].to_numpy() == 1
+
+    # run-length encode: a new run starts wherever the meter or the flag changes
+    change = np.ones(len(flag), dtype=bool)
+    change[1:] = (flag[1:] != flag[:-1]) | (ids[1:] != ids[:-1])
+    starts = np.flatnonzero(change)
+    run_len = np.diff(np.append(starts, len(flag)))
+
+    flagged = flag[starts]
+    if not flagged.any():
+        return pd.DataFrame({"meter_id": pd.unique(ids), "max_streak_days": 0})
+
+    max_streak = (
+        pd.Series(run_len[flagged])
+        .groupby(ids[starts][flagged])
+        .max()
+        .rename_axis("meter_id")
+        .reset_index(name="max_streak_days")
     )
+    return max_streak
 
-    if streak_lengths.empty:
-        return pd.DataFrame({"meter_id": df["meter_id"].unique(), "max_streak_days": 0})
 
-    max_streak = streak_lengths.groupby("meter_id")["streak_len"].max().reset_index()
-    max_streak.columns = ["meter_id", "max_streak_days"]
-    return max_streak
+def load_artifact(path: str):
+    # artifacts are plain pickles (protocol 5), which load several times faster than
+    # joblib's format; fall back to the .joblib files written by older train.py runs
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    return joblib.load(os.path.splitext(path)[0] + ".joblib")
 
 
-@st.cache_data(show_spinner=False)
+# cache_resource keeps a single in-process copy shared by every session and rerun;
+# cache_data would unpickle a fresh copy of all models on each call. The artifacts
+# are only adjusted here at load time and treated as read-only afterwards.
+@st.cache_resource(show_spinner=False)
 def load_artifacts():
     with open(META_PATH, "r") as f:
         meta = json.load(f)
-    models_by_meter = joblib.load(MODELS_PATH)
-    scalers_by_meter = joblib.load(SCALERS_PATH)
-    return meta, models_by_meter, scalers_by_meter
+    models_by_meter = load_artifact(MODELS_PATH)
+    scalers_by_meter = load_artifact(SCALERS_PATH)
+
+    # score() applies each StandardScaler as a fused (x - mean) * (1 / scale) in
+    # float32, so keep just those constants instead of calling transform per meter
+    scaling_by_meter = {
+        key: (scaler.mean_.astype(np.float32), (1.0 / scaler.scale_).astype(np.float32))
+        for key, scaler in scalers_by_meter.items()
+    }
+    return meta, models_by_meter, scaling_by_meter
+
 
+def read_csv_bytes(data: bytes) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(data), engine="pyarrow", parse_dates=["date"], date_format="%Y-%m-%d")
 
-def load_data(power_df: pd.DataFrame, weather_df: pd.DataFrame, start_date: str, end_date: str):
-    power_df = power_df.copy()
-    weather_df = weather_df.copy()
 
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # daily data: export dates as YYYY-MM-DD rather than full timestamps
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.date32()))
+    buf = io.BytesIO()
+    pacsv.write_csv(table, buf)
+    return buf.getvalue()
+
+
+def make_data_key(power_csv: bytes, weather_csv: bytes, start_date: str, end_date: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(hashlib.blake2b(power_csv).digest())
+    h.update(hashlib.blake2b(weather_csv).digest())
+    h.update(f"{start_date}|{end_date}".encode("utf-8"))
+    return h.hexdigest()
+
+
+# Cached functions are keyed on `data_key` (a digest of the input bytes + time window);
+# underscore-prefixed arguments are skipped by Streamlit's hasher.
+@st.cache_data(show_spinner=False, persist="disk")
+def load_data(data_key: str, _power_csv: bytes, _weather_csv: bytes, start_date: str, end_date: str):
+    power_df = read_csv_bytes(_power_csv)
+    weather_df = read_csv_bytes(_weather_csv)
+
+    # no-op for ISO dates parsed at read time; falls back to inference for other formats
     power_df["date"] = pd.to_datetime(power_df["date"])
     weather_df["date"] = pd.to_datetime(weather_df["date"])
 
-    df = power_df.merge(weather_df, on="date", how="left")
+    # weather is one row per date: align it to the power rows with a single
+    # index lookup instead of a hash merge on both key columns
+    weather = weather_df.drop_duplicates("date").set_index("date")
+    aligned = weather.reindex(power_df["date"]).set_axis(power_df.index)
+    df = pd.concat([power_df, aligned], axis=1)
     df = df[(df["date"] >= start_date) & (df["date"] <= end_date)].copy()
     df = df.dropna().sort_values(["meter_id", "date"]).reset_index(drop=True)
     return df
 
 
-def add_features(df: pd.DataFrame, rolling_window_days: int):
+@st.cache_data(show_spinner=False, persist="disk")
+def add_features(data_key: str, _df: pd.DataFrame, rolling_window_days: int):
     w = int(rolling_window_days)
-    df = df.sort_values(["meter_id", "date"]).copy()
+    df = _df.sort_values(["meter_id", "date"]).copy()
 
-    df["rolling_mean_30"] = df.groupby("meter_id")["daily_mean_power"].transform(
-        lambda x: x.rolling(w, min_periods=1).mean()
-    )
-    df["rolling_std_30"] = df.groupby("meter_id")["daily_mean_power"].transform(
-        lambda x: x.rolling(w, min_periods=1).std()
-    )
+    # grouped rolling runs in one compiled pass over the column (no per-meter lambda)
+    rolling = df.groupby("meter_id", sort=False)["daily_mean_power"].rolling(w, min_periods=1)
+    df["rolling_mean_30"] = rolling.mean().droplevel(0)
+    df["rolling_std_30"] = rolling.std().droplevel(0)
     df["residual_30"] = df["daily_mean_power"] - df["rolling_mean_30"]
     df["z_score_30"] = df["residual_30"] / (df["rolling_std_30"] + 1e-6)
     return df
 
 
-def score(df: pd.DataFrame, features: list[str], models_by_meter: dict, scalers_by_meter: dict):
+def _score_meter(model, scaling: tuple[np.ndarray, np.ndarray], X: np.ndarray) -> np.ndarray:
+    # X is this meter's slice of score()'s private matrix, so scale it in place
+    mean, inv_scale = scaling
+    np.subtract(X, mean, out=X)
+    np.multiply(X, inv_scale, out=X)
+    return model.decision_function(X)
+
+
+def score(df: pd.DataFrame, features: list[str], models_by_meter: dict, scaling_by_meter: dict):
     df = df.copy()
-    df["anomaly_score"] = np.nan
 
-    for meter_id, g in df.groupby("meter_id"):
-        key = str(meter_id)
-        if key not in models_by_meter:
-            continue
-        X = g[features].fillna(0)
-        Xs = scalers_by_meter[key].transform(X)
-        df.loc[g.index, "anomaly_score"] = models_by_meter[key].decision_function(Xs)
+    # sort once so each meter is a contiguous slice of the feature matrix
+    meter_ids = df["meter_id"].to_numpy()
+    order = np.argsort(meter_ids, kind="stable")
+    sorted_ids = meter_ids[order]
+    # IsolationForest evaluates trees in float32 anyway, so scale in float32 too.
+    # Fill the matrix column by column from zero-copy column views, already in
+    # meter order, instead of materialising df[features] and a filled copy first.
+    X = np.empty((len(df), len(features)), dtype=np.float32)
+    for j, col in enumerate(features):
+        X[:, j] = df[col].to_numpy()[order]
+    X[np.isnan(X)] = 0
+
+    unique_ids = pd.unique(sorted_ids)
+    bounds = np.append(np.searchsorted(sorted_ids, unique_ids), len(sorted_ids))
+
+    slices = [
+        (str(meter_id), bounds[i], bounds[i + 1])
+        for i, meter_id in enumerate(unique_ids)
+        if str(meter_id) in models_by_meter
+    ]
+
+    # meters are independent and sklearn's tree traversal releases the GIL,
+    # so threads share the already-sliced matrix without copying it
+    n_jobs = max(1, min(os.cpu_count() or 1, len(slices)))
+    results = joblib.Parallel(n_jobs=n_jobs, backend="threading")(
+        joblib.delayed(_score_meter)(models_by_meter[key], scaling_by_meter[key], X[lo:hi])
+        for key, lo, hi in slices
+    )
 
-    return df
+    # one preallocated buffer in the frame's row order; each slice maps back through `order`
+    scores = np.full(len(df), np.nan)
+    for (_, lo, hi), meter_scores in zip(slices, results):
+        scores[order[lo:hi]] = meter_scores
 
+    df["anomaly_score"] = scores
+    return df
 
-def make_report(df: pd.DataFrame, threshold: float):
-    df = df.copy()
-    df["anomaly_flag_global"] = (df["anomaly_score"] <= threshold).astype(int)
 
+def make_report(df: pd.DataFrame):
+    # expects anomaly_flag_global from the scoring step; it is not recomputed here
     max_streak = compute_max_streak(df, "anomaly_flag_global")
 
     report = df.groupby("meter_id").agg(
@@ -320,9 +413,15 @@ def make_report(df: pd.DataFrame, threshold: float):
         percent_anomalous=("anomaly_flag_global", "mean"),
         worst_anomaly_score=("anomaly_score", "min"),
         avg_anomaly_score=("anomaly_score", "mean"),
-        last_anomaly_date=("date", lambda x: x[df.loc[x.index, "anomaly_flag_global"].eq(1)].max()),
     ).reset_index()
 
+    last_anomaly = (
+        df.loc[df["anomaly_flag_global"] == 1]
+        .groupby("meter_id")["date"]
+        .max()
+        .rename("last_anomaly_date")
+    )
+    report = report.merge(last_anomaly, on="meter_id", how="left")
     report = report.merge(max_streak, on="meter_id", how="left")
     report["max_streak_days"] = report["max_streak_days"].fillna(0).astype(int)
 
@@ -331,20 +430,18 @@ def make_report(df: pd.DataFrame, threshold: float):
     report["risk_score"] = 100 * (score_raw - smin) / (smax - smin + 1e-9)
     report["risk_score"] = (report["risk_score"] + report["max_streak_days"] * 5).clip(0, 100).round(1)
 
-    report["risk_level"] = pd.cut(
-        report["risk_score"],
-        bins=[-1, 33, 66, 101],
-        labels=["Low", "Medium", "High"],
-    )
+    # side="left" keeps the bucket edges right-closed; meters without scores stay NaN
+    risk_idx = np.searchsorted(RISK_BINS, report["risk_score"].to_numpy(), side="left")
+    report["risk_level"] = pd.Series(RISK_LABELS[risk_idx], index=report.index).where(report["risk_score"].notna())
 
-    report["alert_message"] = report.apply(generate_alert, axis=1)
+    report["alert_message"] = generate_alerts(report)
     return report
 
 
 def save_outputs(df: pd.DataFrame, report: pd.DataFrame, meta: dict):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    df.to_csv(SCORED_PATH, index=False)
-    report.to_csv(REPORT_PATH, index=False)
+    df.to_parquet(SCORED_PATH, engine="pyarrow", compression="snappy", index=False)
+    report.to_parquet(REPORT_PATH, engine="pyarrow", compression="snappy", index=False)
 
     run_meta = {
         "saved_at": datetime.utcnow().isoformat() + "Z",
@@ -365,12 +462,19 @@ def save_outputs(df: pd.DataFrame, report: pd.DataFrame, meta: dict):
 # Charts
 # --------------------
 def plot_score_distribution(df: pd.DataFrame):
-    fig, ax = plt.subplots()
-    ax.hist(df["anomaly_score"].dropna(), bins=60)
-    ax.set_title("Global Anomaly Score Distribution")
-    ax.set_xlabel("Anomaly Score (lower = more suspicious)")
-    ax.set_ylabel("Count")
-    st.pyplot(fig, use_container_width=True)
+    # bin in NumPy so only the 60 bar heights are sent to the browser
+    counts, edges = np.histogram(df["anomaly_score"].dropna(), bins=60)
+    hist = pd.DataFrame({"bin_start": edges[:-1], "bin_end": edges[1:], "count": counts})
+    chart = (
+        alt.Chart(hist, title="Global Anomaly Score Distribution")
+        .mark_bar()
+        .encode(
+            x=alt.X("bin_start:Q", title="Anomaly Score (lower = more suspicious)"),
+            x2="bin_end:Q",
+            y=alt.Y("count:Q", title="Count"),
+        )
+    )
+    st.altair_chart(chart, use_container_width=True)
 
 
 def plot_daily_anomalies(df: pd.DataFrame):
@@ -390,23 +494,29 @@ def plot_top_risk(report: pd.DataFrame, top_n: int = 10):
 
 
 def plot_meter_timeseries(meter_df: pd.DataFrame):
-    meter_df = meter_df.sort_values("date").copy()
-
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(meter_df["date"], meter_df["daily_mean_power"], label="Daily Mean Power")
+    meter_df = meter_df.sort_values("date")
 
+    series = {"daily_mean_power": "Daily Mean Power"}
     if "rolling_mean_30" in meter_df.columns:
-        ax.plot(meter_df["date"], meter_df["rolling_mean_30"], label="Rolling Mean")
+        series["rolling_mean_30"] = "Rolling Mean"
+    lines_df = meter_df.melt(id_vars="date", value_vars=list(series), var_name="series", value_name="power")
+    lines_df["series"] = lines_df["series"].map(series)
+
+    lines = alt.Chart(lines_df).mark_line().encode(
+        x=alt.X("date:T", title="Date"),
+        y=alt.Y("power:Q", title="Power"),
+        color=alt.Color("series:N", title=None),
+    )
 
-    anom = meter_df[meter_df["anomaly_flag_global"] == 1]
-    if len(anom) > 0:
-        ax.scatter(anom["date"], anom["daily_mean_power"], label="Flagged Days")
+    anom = meter_df.loc[meter_df["anomaly_flag_global"] == 1, ["date", "daily_mean_power"]]
+    flagged = alt.Chart(anom).mark_circle(size=60, color="#ef4444").encode(
+        x="date:T",
+        y="daily_mean_power:Q",
+        tooltip=[alt.Tooltip("date:T", title="Flagged Day"), alt.Tooltip("daily_mean_power:Q", title="Power")],
+    )
 
-    ax.set_title("Meter Consumption + Flagged Anomalies")
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Power")
-    ax.legend()
-    st.pyplot(fig, use_container_width=True)
+    chart = (lines + flagged).properties(title="Meter Consumption + Flagged Anomalies")
+    st.altair_chart(chart, use_container_width=True)
 
 
 def kpi_card(label: str, value: str):
@@ -425,7 +535,7 @@ def kpi_card(label: str, value: str):
 # Sidebar controls
 # --------------------
 try:
-    meta, models_by_meter, scalers_by_meter = load_artifacts()
+    meta, models_by_meter, scaling_by_meter = load_artifacts()
 except Exception as e:
     st.error("Artifacts not found. Ensure `artifacts/` exists in the repo.")
     st.exception(e)
@@ -489,20 +599,23 @@ if run_btn:
             if power_file is None or weather_file is None:
                 st.error("Upload both CSV files.")
                 st.stop()
-            power_df = pd.read_csv(power_file)
-            weather_df = pd.read_csv(weather_file)
+            power_csv = power_file.getvalue()
+            weather_csv = weather_file.getvalue()
         else:
-            power_df = pd.read_csv(POWER_PATH)
-            weather_df = pd.read_csv(WEATHER_PATH)
+            with open(POWER_PATH, "rb") as f:
+                power_csv = f.read()
+            with open(WEATHER_PATH, "rb") as f:
+                weather_csv = f.read()
 
-        df = load_data(power_df, weather_df, meta["start_date"], meta["end_date"])
-        df = add_features(df, meta["rolling_window_days"])
-        df = score(df, meta["features"], models_by_meter, scalers_by_meter)
+        data_key = make_data_key(power_csv, weather_csv, meta["start_date"], meta["end_date"])
+        df = load_data(data_key, power_csv, weather_csv, meta["start_date"], meta["end_date"])
+        df = add_features(data_key, df, meta["rolling_window_days"])
+        df = score(df, meta["features"], models_by_meter, scaling_by_meter)
 
         # apply global flag
         df["anomaly_flag_global"] = (df["anomaly_score"] <= float(meta["global_threshold"])).astype(int)
 
-        report = make_report(df, float(meta["global_threshold"]))
+        report = make_report(df)
 
         # save outputs (for pages/visualization.py and downloads)
         save_outputs(df, report, meta)
@@ -604,7 +717,7 @@ if run_btn:
         st.subheader("Export")
         st.write("Download the inspection report and scored daily output.")
 
-        report_bytes = report.to_csv(index=False).encode("utf-8")
+        report_bytes = to_csv_bytes(report)
         st.download_button(
             "Download Inspection Report (CSV)",
             report_bytes,
@@ -612,7 +725,7 @@ if run_btn:
             mime="text/csv",
         )
 
-        scored_bytes = df.to_csv(index=False).encode("utf-8")
+        scored_bytes = to_csv_bytes(df)
         st.download_button(
             "Download Scored Output (CSV)",
             scored_bytes,
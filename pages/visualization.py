@@ -7,19 +7,16 @@ st.set_page_config(page_title="Visualizations", layout="wide")
 st.title("Anomaly Detection Visualizations")
 
 # Paths saved by app.py after running scoring
-SCORED_PATH = "outputs/scored_output.csv"
-REPORT_PATH = "outputs/inspection_report.csv"
+SCORED_PATH = "outputs/scored_output.parquet"
+REPORT_PATH = "outputs/inspection_report.parquet"
 
 # Check files exist 
 if not os.path.exists(SCORED_PATH):
     st.warning("Scored dataset not found. Run scoring first on the main page.")
     st.stop()
 
-df = pd.read_csv(SCORED_PATH)
-
-# Convert date
-if "date" in df.columns:
-    df["date"] = pd.to_datetime(df["date"])
+# Parquet keeps dtypes, so dates come back as datetimes without re-parsing
+df = pd.read_parquet(SCORED_PATH)
 
 # 1) Score Distribution
 st.subheader("Global Anomaly Score Distribution")
@@ -29,6 +26,7 @@ ax.hist(df["anomaly_score"].dropna(), bins=60)
 ax.set_xlabel("Anomaly Score (lower = more anomalous)")
 ax.set_ylabel("Count")
 st.pyplot(fig)
+plt.close(fig)
 
 st.caption("Lower anomaly scores represent more suspicious observations.")
 
@@ -55,15 +53,16 @@ ax2.legend()
 ax2.set_xlabel("Date")
 ax2.set_ylabel("Power")
 st.pyplot(fig2)
+plt.close(fig2)
 
 # 3) Risk Ranking (from report)
 st.subheader("Inspection Priority Ranking (Risk Score)")
 
 if not os.path.exists(REPORT_PATH):
-    st.info("Inspection report not found yet. Run scoring first to generate outputs/inspection_report.csv.")
+    st.info("Inspection report not found yet. Run scoring first to generate outputs/inspection_report.parquet.")
     st.stop()
 
-report = pd.read_csv(REPORT_PATH)
+report = pd.read_parquet(REPORT_PATH)
 
 if "risk_score" in report.columns:
     report = report.sort_values("risk_score", ascending=False)
@@ -73,5 +72,6 @@ if "risk_score" in report.columns:
     ax3.set_ylabel("Risk Score (0–100)")
     ax3.set_xlabel("Meter ID")
     st.pyplot(fig3)
+    plt.close(fig3)
 else:
     st.info("risk_score column not found in inspection report.")
\ No newline at end of file
@@ -1,6 +1,6 @@
 import os
 import json
-import joblib
+import pickle
 import numpy as np
 import pandas as pd
 from datetime import datetime
@@ -97,8 +97,11 @@ global_threshold = float(df["anomaly_score"].quantile(GLOBAL_ANOMALY_RATE))
 # -----------------------
 # Save artifacts
 # -----------------------
-joblib.dump(models_by_meter, os.path.join(ARTIFACT_DIR, "models_by_meter.joblib"))
-joblib.dump(scalers_by_meter, os.path.join(ARTIFACT_DIR, "scalers_by_meter.joblib"))
+# plain pickle (protocol 5) loads several times faster than joblib for these artifacts
+with open(os.path.join(ARTIFACT_DIR, "models_by_meter.pkl"), "wb") as f:
+    pickle.dump(models_by_meter, f, protocol=5)
+with open(os.path.join(ARTIFACT_DIR, "scalers_by_meter.pkl"), "wb") as f:
+    pickle.dump(scalers_by_meter, f, protocol=5)
 
 meta = {
     "trained_at": datetime.utcnow().isoformat() + "Z",